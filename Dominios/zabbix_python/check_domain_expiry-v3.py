@@ -157,10 +157,37 @@ def days_until_expiry(domain):
     return -1  # Falha em todos os métodos
 
 
+def cached_days(store_path, domain, max_age_days):
+    """
+    Dias restantes a partir do cache compacto gerado pelo prefetch
+    (check_domains_from_file-v2.py --store). None se ausente, com erro ou vencido.
+    O valor é o mesmo da consulta ao vivo, (expiry - now).days, para o item do
+    Zabbix não oscilar entre N e N+1 conforme o cache responda ou não.
+    """
+    try:
+        from domain_store import DomainStore, STATUS_CODES
+        now = time.time()
+        with DomainStore(store_path) as store:
+            i = store.index(domain.strip())
+            if i < 0 or store.status[i] == STATUS_CODES['error']:
+                return None
+            if now - store.checked[i] > max_age_days * 86400:
+                return None
+            if store.status[i] == STATUS_CODES['not_found']:
+                return -1
+            return store.days_left(i, now)
+    except (OSError, ValueError, ImportError):
+        return None
+
+
 def main():
     parser = argparse.ArgumentParser(description="Verifica expiração de domínio.")
     parser.add_argument('domain', nargs='?', help="Domínio")
     parser.add_argument('--domains', nargs='+', help="Vários domínios")
+    parser.add_argument('--cache', metavar='ARQUIVO',
+                        help="Cache compacto do prefetch; consulta whois só se o domínio não estiver nele")
+    parser.add_argument('--max-age', type=float, default=7, metavar='DIAS',
+                        help="Idade máxima aceita no cache (padrão: 7)")
     args = parser.parse_args()
 
     domains = args.domains or ([args.domain] if args.domain else [])
@@ -170,7 +197,9 @@ def main():
         return
 
     for domain in domains:
-        days = days_until_expiry(domain)
+        days = cached_days(args.cache, domain, args.max_age) if args.cache else None
+        if days is None:
+            days = days_until_expiry(domain)
         if len(domains) == 1:
             print(days)
             return
@@ -2,13 +2,26 @@
 """
 Verifica expiração de domínios sem API.
 Suporta: .com, .cn, .com.br, .org, .com.uy, etc.
-Usa whois com servidores específicos.
+Usa RDAP (JSON via HTTPS) quando o registro publica, e whois com servidores
+específicos (porta 43) como alternativa.
 """
 
+import os
 import sys
 import re
+import json
+import math
+import zlib
+import bisect
+import hashlib
+import sqlite3
 import subprocess
 import argparse
+import socket
+import http.client
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit, quote
 from datetime import datetime, timezone
 import time
 
@@ -28,6 +41,292 @@ WHOIS_SERVERS = {
     '.com.uy': 'whois.anteldata.com.uy',
 }
 
+# Mapeamento de TLDs para servidores RDAP (URL base, terminando em '/')
+# TLDs fora desta lista usam apenas whois (ex: .cn e .com.uy não publicam RDAP)
+RDAP_SERVERS = {
+    '.com': 'https://rdap.verisign.com/com/v1/',
+    '.net': 'https://rdap.verisign.com/net/v1/',
+    '.org': 'https://rdap.publicinterestregistry.org/rdap/',
+    '.info': 'https://rdap.identitydigital.services/rdap/',
+    '.br': 'https://rdap.registro.br/',
+}
+
+RDAP_TIMEOUT = 15
+WHOIS_TIMEOUT = 30
+MIN_TIMEOUT = 3
+# Fração do tempo restante que um domínio pode usar antes de ser adiado
+DEADLINE_SHARE = 0.25
+
+# Conexões HTTPS keep-alive reutilizadas por URL base RDAP
+_rdap_connections = {}
+
+# Modo incremental (--state): validade dos resultados guardados
+DEFAULT_MAX_AGE_DAYS = 7
+NEAR_EXPIRY_DAYS = 60            # Perto do vencimento: reconsulta diária (renovação muda a data)
+NEAR_EXPIRY_MAX_AGE = 20 * 3600  # Menos de 24h para não escapar do cron diário
+ERROR_MAX_AGE = 3600             # Erros são reconsultados na execução seguinte
+PREFETCH_AHEAD = 24 * 3600       # --prefetch renova o que venceria até a próxima execução
+
+# Modo --changes-only: limiares (mesmos do template: < 30 / < 60) e heartbeat
+DEFAULT_THRESHOLDS = '30,60'
+DEFAULT_HEARTBEAT_HOURS = 24
+
+# Modo distribuído (--nodes/--coord): cota global por servidor, repartida entre os nós
+DEFAULT_RATE_PER_MIN = 40  # Equivale à pausa de 1.5s entre consultas
+VIRTUAL_NODES = 64         # Pontos por nó no anel de hash consistente
+
+# Mensagens que indicam bloqueio por limite de consultas
+BLOCKED_MESSAGES = [
+    'not allowed', 'blocked', 'rate limit', 'exceeded', 'não permitido',
+    'query rejected', 'too many requests', 'access denied'
+]
+
+
+class StageStats:
+    """
+    Acumula tempos por servidor e etapa, e contadores de erros/bloqueios.
+    Etapas: dns, connect (TCP+TLS), server (espera da resposta), read,
+    whois (comando whois completo), parse, sleep e queue (espera pela cota global).
+    """
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self.samples = defaultdict(list)  # (servidor, etapa) -> [segundos]
+        self.counters = defaultdict(int)  # (servidor, tipo) -> total
+
+    def add(self, server, stage, seconds):
+        self.samples[(server, stage)].append(seconds)
+
+    def incr(self, server, kind):
+        self.counters[(server, kind)] += 1
+
+    @staticmethod
+    def percentile(values, q):
+        """Percentil por posição (nearest-rank) de uma lista ordenada."""
+        if not values:
+            return 0.0
+        index = max(0, min(len(values) - 1, math.ceil(q * len(values)) - 1))
+        return values[index]
+
+    def summary(self):
+        """Retorna [(servidor, etapa, n, soma, {quantil: valor})] ordenado."""
+        rows = []
+        for (server, stage), values in sorted(self.samples.items()):
+            ordered = sorted(values)
+            quantiles = {q: self.percentile(ordered, q) for q in self.QUANTILES}
+            rows.append((server, stage, len(ordered), sum(ordered), quantiles))
+        return rows
+
+    def to_text(self):
+        lines = [f"{'servidor':<34} {'etapa':<8} {'n':>5} {'p50':>8} {'p95':>8} {'p99':>8}"]
+        for server, stage, count, total, qs in self.summary():
+            lines.append(f"{server:<34} {stage:<8} {count:>5} "
+                         f"{qs[0.5]:>8.3f} {qs[0.95]:>8.3f} {qs[0.99]:>8.3f}")
+        for (server, kind), value in sorted(self.counters.items()):
+            lines.append(f"{server:<34} {kind}: {value}")
+        return '\n'.join(lines)
+
+    def to_prometheus(self):
+        """Formato texto do Prometheus (node_exporter textfile collector)."""
+        lines = [
+            '# HELP domain_expiry_stage_seconds Tempo por etapa da consulta de expiração.',
+            '# TYPE domain_expiry_stage_seconds summary',
+        ]
+        for server, stage, count, total, qs in self.summary():
+            labels = f'server="{server}",stage="{stage}"'
+            for q, value in qs.items():
+                lines.append(f'domain_expiry_stage_seconds{{{labels},quantile="{q}"}} {value:.6f}')
+            lines.append(f'domain_expiry_stage_seconds_sum{{{labels}}} {total:.6f}')
+            lines.append(f'domain_expiry_stage_seconds_count{{{labels}}} {count}')
+        lines.append('# HELP domain_expiry_events_total Consultas, erros e bloqueios por servidor.')
+        lines.append('# TYPE domain_expiry_events_total counter')
+        for (server, kind), value in sorted(self.counters.items()):
+            lines.append(f'domain_expiry_events_total{{server="{server}",kind="{kind}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def to_zabbix(self, host='-'):
+        """
+        Arquivo de entrada do zabbix_sender (-i): '<host> <chave> <valor>'.
+        Começa pelas listas LLD (servidor/etapa e servidor/evento) do template
+        'Domain Expiry Stats' (Dominios/zabbix_template/whois stats.yaml).
+        """
+        def lld(rows):
+            value = json.dumps(rows)
+            return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+        rows = self.summary()
+        stages = [{'{#SERVER}': server, '{#STAGE}': stage} for server, stage, *_ in rows]
+        events = [{'{#SERVER}': server, '{#KIND}': kind} for server, kind in sorted(self.counters)]
+        lines = [f'{host} whois.stage.discovery {lld(stages)}',
+                 f'{host} whois.events.discovery {lld(events)}']
+        for server, stage, count, total, qs in rows:
+            for q, value in qs.items():
+                lines.append(f'{host} whois.stage.p{int(q * 100)}[{server},{stage}] {value:.6f}')
+            lines.append(f'{host} whois.stage.count[{server},{stage}] {count}')
+        for (server, kind), value in sorted(self.counters.items()):
+            lines.append(f'{host} whois.events[{server},{kind}] {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# Instrumentação desligada por padrão; main() cria um StageStats com --stats*
+stats = None
+
+
+@contextmanager
+def timed(server, stage):
+    """Mede o bloco e registra em `stats` (se a instrumentação estiver ativa)."""
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.add(server, stage, time.perf_counter() - start)
+
+
+def count(server, kind):
+    """Incrementa contador de eventos (requests, errors, rate_limited)."""
+    if stats is not None:
+        stats.incr(server, kind)
+
+
+class AdaptiveTimeouts:
+    """
+    Timeout por servidor derivado das latências observadas:
+    p95 * fator, limitado entre MIN_TIMEOUT e o timeout padrão.
+    """
+
+    def __init__(self, factor=3.0, min_samples=5, keep=200):
+        self.factor = factor
+        self.min_samples = min_samples
+        self.keep = keep
+        self.samples = defaultdict(list)  # servidor -> [segundos]
+
+    def observe(self, server, seconds):
+        values = self.samples[server]
+        values.append(seconds)
+        if len(values) > self.keep:
+            del values[:len(values) - self.keep]
+
+    def timeout_for(self, server, default):
+        values = self.samples.get(server)
+        if not values or len(values) < self.min_samples:
+            return default
+        p95 = StageStats.percentile(sorted(values), 0.95)
+        return max(MIN_TIMEOUT, min(default, p95 * self.factor))
+
+    def load(self, path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                for server, values in json.load(f).items():
+                    self.samples[server] = [float(v) for v in values][-self.keep:]
+        except (OSError, ValueError):
+            pass  # Sem histórico: usa os timeouts padrão
+
+    def save(self, path):
+        write_file_atomic(path, json.dumps(self.samples, indent=1))
+
+
+class DeferDomain(Exception):
+    """Domínio lento ou sem orçamento de tempo: fica para o fim do lote ou próxima execução."""
+
+
+# Ativados por main() com --adaptive-timeouts / --deadline
+timeouts = None
+deadline = None  # time.monotonic() limite do lote
+retry_pass = False  # Domínios adiados para o fim do lote podem usar todo o tempo restante
+
+
+def query_timeout(server, default):
+    """Timeout da consulta: adaptativo por servidor e limitado ao tempo restante do lote."""
+    timeout = timeouts.timeout_for(server, default) if timeouts else default
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining < 1:
+            raise DeferDomain(server)
+        if not retry_pass:
+            remaining = max(MIN_TIMEOUT, remaining * DEADLINE_SHARE)
+        timeout = min(timeout, remaining, deadline - time.monotonic())
+    return timeout
+
+
+class HashRing:
+    """Anel de hash consistente: cada domínio base pertence a um único nó."""
+
+    def __init__(self, nodes, vnodes=VIRTUAL_NODES):
+        self.ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in set(nodes) for i in range(vnodes)
+        )
+        self.keys = [key for key, _ in self.ring]
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+    def node_for(self, key):
+        index = bisect.bisect(self.keys, self._hash(key)) % len(self.keys)
+        return self.ring[index][1]
+
+
+class Coordinator:
+    """
+    Cota global de consultas por servidor, compartilhada entre processos/nós
+    via SQLite: cada consulta reserva o próximo horário livre do servidor.
+    """
+
+    def __init__(self, path, rate_per_min=DEFAULT_RATE_PER_MIN):
+        self.interval = 60.0 / rate_per_min
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute('CREATE TABLE IF NOT EXISTS slots (server TEXT PRIMARY KEY, next_at REAL)')
+
+    def reserve(self, server, latest=None):
+        """
+        Reserva um horário para consultar `server` e retorna o horário (time.time()).
+        Retorna None sem reservar se o horário livre passar de `latest`.
+        """
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            row = self.db.execute('SELECT next_at FROM slots WHERE server = ?', (server,)).fetchone()
+            slot = max(time.time(), row[0] if row else 0)
+            if latest is not None and slot > latest:
+                return None
+            self.db.execute('INSERT OR REPLACE INTO slots (server, next_at) VALUES (?, ?)',
+                            (server, slot + self.interval))
+            return slot
+        finally:
+            self.db.execute('COMMIT')
+
+    def close(self):
+        self.db.close()
+
+
+# Ativado por main() com --coord
+coordinator = None
+
+
+def wait_for_slot(server):
+    """Aguarda a vez de consultar `server` dentro da cota global (se houver coordenação)."""
+    if coordinator is None:
+        return
+    latest = None
+    if deadline is not None:
+        latest = time.time() + (deadline - time.monotonic()) - 1
+    slot = coordinator.reserve(server, latest)
+    if slot is None:
+        raise DeferDomain(server)
+    with timed(server, 'queue'):
+        time.sleep(max(0, slot - time.time()))
+
+
+def write_file_atomic(path, content):
+    """Grava via arquivo temporário + rename (leitores nunca veem arquivo parcial)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
 # Mapeamento de meses
 MONTH_MAP = {
     'jan': 1, 'fev': 2, 'mar': 3, 'abr': 4, 'mai': 5, 'jun': 6,
@@ -86,39 +385,236 @@ def get_whois_server(domain):
     return None
 
 
+def get_rdap_server(domain):
+    """Retorna URL base RDAP com base no TLD."""
+    domain = domain.lower()
+    for tld, server in sorted(RDAP_SERVERS.items(), key=lambda x: len(x[0]), reverse=True):
+        if domain.endswith(tld):
+            return server
+    return None
+
+
+def _timed_create_connection(server):
+    """
+    Substitui socket.create_connection separando o tempo de DNS.
+    O tempo fica também em create_connection.dns_time, para ser descontado do connect.
+    """
+    def create_connection(address, timeout=None, source_address=None, *args, **kwargs):
+        host, port = address
+        start = time.perf_counter()
+        try:
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        finally:
+            create_connection.dns_time = time.perf_counter() - start
+            stats.add(server, 'dns', create_connection.dns_time)
+        error = OSError(f"sem endereço para {host}")
+        for family, socktype, proto, _, sockaddr in infos:
+            sock = socket.socket(family, socktype, proto)
+            try:
+                if isinstance(timeout, (int, float)):
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                error = e
+                sock.close()
+        raise error
+    return create_connection
+
+
+def _rdap_connection(base_url):
+    """Retorna conexão persistente para a URL base (cria se necessário)."""
+    parts = urlsplit(base_url)
+    key = (parts.scheme, parts.netloc)
+    conn = _rdap_connections.get(key)
+    if conn is None:
+        if parts.scheme == 'http':
+            conn = http.client.HTTPConnection(parts.netloc, timeout=RDAP_TIMEOUT)
+        else:
+            conn = http.client.HTTPSConnection(parts.netloc, timeout=RDAP_TIMEOUT)
+        if stats is not None:
+            conn._create_connection = _timed_create_connection(parts.netloc)
+        _rdap_connections[key] = conn
+    return conn
+
+
+def _connect(conn, server):
+    """Abre a conexão medindo só TCP+TLS (o DNS já é medido à parte)."""
+    if stats is None:
+        conn.connect()
+        return
+    create_connection = conn._create_connection
+    create_connection.dns_time = 0.0
+    start = time.perf_counter()
+    try:
+        conn.connect()
+    finally:
+        stats.add(server, 'connect', time.perf_counter() - start - create_connection.dns_time)
+
+
+def close_rdap_connections():
+    """Fecha as conexões RDAP abertas."""
+    for conn in _rdap_connections.values():
+        conn.close()
+    _rdap_connections.clear()
+
+
+def query_rdap(domain, base_url):
+    """
+    Consulta RDAP reutilizando a conexão keep-alive da URL base.
+    Retorna (status_http, json) ou (None, None) se o servidor estiver indisponível.
+    """
+    path = urlsplit(base_url).path or '/'
+    if not path.endswith('/'):
+        path += '/'
+    path += 'domain/' + quote(domain)
+    headers = {'Accept': 'application/rdap+json', 'Connection': 'keep-alive'}
+    server = urlsplit(base_url).netloc
+
+    wait_for_slot(server)
+    count(server, 'requests')
+    # Segunda tentativa cobre conexão keep-alive fechada pelo servidor
+    for attempt in range(2):
+        timeout = query_timeout(server, RDAP_TIMEOUT)
+        conn = _rdap_connection(base_url)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        start = time.monotonic()
+        try:
+            if conn.sock is None:
+                _connect(conn, server)
+            with timed(server, 'server'):
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+            with timed(server, 'read'):
+                body = response.read()
+        except TimeoutError:
+            conn.close()
+            _rdap_connections.pop((urlsplit(base_url).scheme, server), None)
+            count(server, 'timeouts')
+            if timeouts:
+                timeouts.observe(server, timeout)
+            if deadline is not None:
+                raise DeferDomain(server)
+            continue
+        except (OSError, http.client.HTTPException):
+            # Descarta a conexão; a próxima chamada abre uma nova
+            conn.close()
+            _rdap_connections.pop((urlsplit(base_url).scheme, server), None)
+            continue
+
+        if timeouts:
+            timeouts.observe(server, time.monotonic() - start)
+        if response.status == 429:
+            count(server, 'rate_limited')
+        elif response.status >= 500:
+            count(server, 'errors')
+        if response.status != 200:
+            return response.status, None
+        try:
+            with timed(server, 'parse'):
+                return response.status, json.loads(body.decode('utf-8', errors='replace'))
+        except ValueError:
+            count(server, 'errors')
+            return None, None
+
+    count(server, 'errors')
+    return None, None
+
+
+def extract_rdap_expiry(data):
+    """
+    Extrai a data do evento 'expiration' da resposta RDAP, à meia-noite UTC
+    como no whois (parse_date), para os dias restantes não dependerem da fonte.
+    """
+    if not isinstance(data, dict):
+        return None
+    for event in data.get('events') or []:
+        if event.get('eventAction') != 'expiration':
+            continue
+        date_str = event.get('eventDate') or ''
+        try:
+            # fromisoformat só aceita 'Z' a partir do Python 3.11
+            dt = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        dt = dt.astimezone(timezone.utc)
+        return datetime(dt.year, dt.month, dt.day, tzinfo=timezone.utc)
+    return None
+
+
+def extract_rdap_registrar(data):
+    """Nome do registrar (entidade com papel 'registrar') na resposta RDAP."""
+    if not isinstance(data, dict):
+        return None
+    for entity in data.get('entities') or []:
+        if 'registrar' not in (entity.get('roles') or []):
+            continue
+        vcard = entity.get('vcardArray') or [None, []]
+        for field in vcard[1] if len(vcard) > 1 else []:
+            if field and field[0] == 'fn' and len(field) > 3:
+                return str(field[3]).strip() or None
+    return None
+
+
+def extract_registrar(text):
+    """Nome do registrar na resposta whois (quando informado)."""
+    match = re.search(r'^\s*(?:Registrar|Sponsoring Registrar):\s*(\S.*)$', text, re.IGNORECASE | re.MULTILINE)
+    return match.group(1).strip() if match else None
+
+
 def query_whois(domain, server=None):
     """Executa whois com servidor específico."""
+    stats_server = server or 'whois'
+    wait_for_slot(stats_server)
+    timeout = query_timeout(stats_server, WHOIS_TIMEOUT)
+    count(stats_server, 'requests')
     try:
         cmd = ['whois']
         if server:
             cmd += ['-h', server]
         cmd.append(domain)
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            encoding='utf-8',
-            errors='replace'  # Substitui caracteres inválidos
-        )
+        start = time.monotonic()
+        with timed(stats_server, 'whois'):
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                encoding='utf-8',
+                errors='replace'  # Substitui caracteres inválidos
+            )
+        if timeouts:
+            timeouts.observe(stats_server, time.monotonic() - start)
 
         if result.returncode != 0:
+            count(stats_server, 'errors')
             return None
 
         output = result.stdout
 
         # Verifica se foi bloqueado
-        blocked = [
-            'not allowed', 'blocked', 'rate limit', 'exceeded', 'não permitido',
-            'query rejected', 'too many requests', 'access denied'
-        ]
-        if any(msg in output.lower() for msg in blocked):
+        if any(msg in output.lower() for msg in BLOCKED_MESSAGES):
+            count(stats_server, 'rate_limited')
             return None
 
         return output
 
+    except subprocess.TimeoutExpired:
+        count(stats_server, 'timeouts')
+        if timeouts:
+            timeouts.observe(stats_server, timeout)
+        if deadline is not None:
+            raise DeferDomain(stats_server)
+        return None
     except Exception as e:
+        count(stats_server, 'errors')
         return None
 
 
@@ -149,50 +645,119 @@ def extract_expiry(text, domain):
     return None
 
 
-def days_until_expiry(domain):
-    """Retorna dias até expiração com múltiplos métodos."""
+def registrable_domain(domain):
+    """Extrai o domínio base (sem subdomínios)."""
+    parts = domain.split('.')
+    if len(parts) >= 3 and parts[-2] in ['com', 'net', 'org', 'co'] and len(parts[-1]) == 2:
+        return '.'.join(parts[-3:])
+    return '.'.join(parts[-2:])
+
+
+def check_domain(domain, use_rdap=True):
+    """
+    Consulta a expiração com múltiplos métodos.
+    Retorna dict: expiry (datetime ou None), status ('ok', 'not_found', 'error'),
+    server e registrar (quando informado).
+    """
     domain = domain.strip().lower()
     if not domain or '.' not in domain:
-        return -1
+        return {'expiry': None, 'status': 'error', 'server': None}
 
-    # Extração do domínio base (sem subdomínios)
-    parts = domain.split('.')
-    if len(parts) >= 3 and parts[-2] in ['com', 'net', 'org', 'co'] and len(parts[-1]) == 2:
-        base_domain = '.'.join(parts[-3:])
-    else:
-        base_domain = '.'.join(parts[-2:])
+    base_domain = registrable_domain(domain)
+
+    # 1. Tentar RDAP (JSON estruturado), se o TLD publicar
+    rdap_server = get_rdap_server(domain) if use_rdap else None
+    if rdap_server:
+        status, data = query_rdap(base_domain, rdap_server)
+        server = urlsplit(rdap_server).netloc
+        if status == 404:
+            # Domínio não existe, não adianta cair para whois
+            return {'expiry': None, 'status': 'not_found', 'server': server}
+        if status == 429:
+            # Registro limitou a taxa: cair para whois (mesmo registro) só aumentaria a carga
+            if deadline is not None:
+                raise DeferDomain(server)
+            return {'expiry': None, 'status': 'error', 'server': server}
+        expiry = extract_rdap_expiry(data)
+        if expiry:
+            return {'expiry': expiry, 'status': 'ok', 'server': server,
+                    'registrar': extract_rdap_registrar(data)}
 
-    # 1. Tentar com servidor específico
+    # 2. Tentar whois com servidor específico
     server = get_whois_server(domain)
     if server:
         text = query_whois(base_domain, server)
         if text:
-            expiry = extract_expiry(text, domain)
+            with timed(server, 'parse'):
+                expiry = extract_expiry(text, domain)
             if expiry:
-                now = datetime.now(timezone.utc)
-                return (expiry - now).days
+                return {'expiry': expiry, 'status': 'ok', 'server': server,
+                        'registrar': extract_registrar(text)}
 
-    # 2. Tentar whois padrão
+    # 3. Tentar whois padrão
     text = query_whois(base_domain)
     if text:
-        expiry = extract_expiry(text, domain)
+        with timed('whois', 'parse'):
+            expiry = extract_expiry(text, domain)
         if expiry:
-            now = datetime.now(timezone.utc)
-            return (expiry - now).days
+            return {'expiry': expiry, 'status': 'ok', 'server': 'whois',
+                    'registrar': extract_registrar(text)}
 
-    return -1
+    return {'expiry': None, 'status': 'error', 'server': server}
+
+
+def days_left(expiry):
+    """Dias até a expiração (-1 se não houver data)."""
+    if not expiry:
+        return -1
+    return (expiry - datetime.now(timezone.utc)).days
+
+
+def days_until_expiry(domain, use_rdap=True):
+    """Retorna dias até expiração com múltiplos métodos."""
+    return days_left(check_domain(domain, use_rdap)['expiry'])
+
+
+def _macro_values(data, macro):
+    """Percorre o export JSON do Zabbix e retorna os valores da macro."""
+    if isinstance(data, dict):
+        if data.get('macro') == macro and data.get('value'):
+            yield data['value']
+        for value in data.values():
+            yield from _macro_values(value, macro)
+    elif isinstance(data, list):
+        for item in data:
+            yield from _macro_values(item, macro)
+
+
+def read_macro_export(text, file_path, macro='{$DOMAINNAME}'):
+    """Extrai os domínios da macro de um export de hosts do Zabbix (YAML, JSON ou XML)."""
+    if file_path.endswith('.json'):
+        return list(_macro_values(json.loads(text), macro))
+    if file_path.endswith('.xml'):
+        pattern = r'<macro>' + re.escape(macro) + r'</macro>\s*<value>([^<]+)</value>'
+    else:
+        # YAML: "- macro: '{$DOMAINNAME}'" seguido de "value: dominio"
+        pattern = r'macro:\s*[\'"]?' + re.escape(macro) + r'[\'"]?\s*\n\s*value:\s*[\'"]?([^\'"\s]+)'
+    return re.findall(pattern, text)
 
 
 def read_domains(file_path):
-    """Lê domínios de um arquivo."""
+    """Lê domínios de um arquivo (lista simples ou export de hosts do Zabbix)."""
     domains = []
+    seen = set()
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
+            if file_path.endswith(('.yaml', '.yml', '.json', '.xml')):
+                lines = read_macro_export(f.read(), file_path)
+            else:
+                lines = f
+            for line in lines:
                 line = line.strip()
                 if line and not line.startswith('#'):
                     domain = re.sub(r'https?://|www\.', '', line).split('/')[0].strip()
-                    if domain:
+                    if domain and domain not in seen:
+                        seen.add(domain)
                         domains.append(domain)
     except Exception as e:
         print(f"Erro ao ler {file_path}: {e}", file=sys.stderr)
@@ -200,17 +765,295 @@ def read_domains(file_path):
     return domains
 
 
+def load_state(path):
+    """
+    Lê o estado da execução anterior:
+    {'domains': {dominio: {expiry, status, server, checked, reported}}, 'heartbeat': ts}
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get('domains'), dict):
+            return data
+    except (OSError, ValueError):
+        pass
+    return {'version': 1, 'domains': {}, 'heartbeat': 0}
+
+
+def save_state(path, data):
+    write_file_atomic(path, json.dumps(data, indent=1, sort_keys=True))
+
+
+def result_to_entry(result, checked):
+    """Converte o resultado de check_domain() em registro serializável."""
+    expiry = result['expiry']
+    return {
+        'expiry': expiry.isoformat() if expiry else None,
+        'status': result['status'],
+        'server': result['server'],
+        'registrar': result.get('registrar'),
+        'checked': int(checked),
+    }
+
+
+def entry_expiry(entry):
+    """Data de expiração guardada no estado (datetime ou None)."""
+    if not entry.get('expiry'):
+        return None
+    return datetime.fromisoformat(entry['expiry'])
+
+
+def is_stale(domain, entry, now_ts, max_age):
+    """Indica se o resultado guardado precisa ser consultado de novo."""
+    if entry is None:
+        return True
+    age = now_ts - entry.get('checked', 0)
+    if entry.get('status') == 'error':
+        return age >= ERROR_MAX_AGE
+    # Inclui os já vencidos: renovação no período de carência muda a data
+    expiry = entry_expiry(entry)
+    if entry.get('status') == 'ok' and expiry and days_left(expiry) < NEAR_EXPIRY_DAYS:
+        max_age = min(max_age, NEAR_EXPIRY_MAX_AGE)
+    # Até 20% de variação por domínio espalha as reconsultas entre os dias
+    jitter = (zlib.crc32(domain.encode('utf-8')) % 1000) / 5000
+    return age >= max_age * (1 - jitter)
+
+
+def threshold_bucket(days, thresholds):
+    """Quantos limiares o domínio já cruzou (ex: 45 dias com [30, 60] -> 1)."""
+    if days < 0:
+        return None  # Erro ou sem data: tratado pelo status
+    return sum(1 for limit in thresholds if days < limit)
+
+
+def material_state(entry, thresholds):
+    """O que precisa mudar para o domínio ser reemitido no modo --changes-only."""
+    return {
+        'expiry': (entry.get('expiry') or '')[:10],  # Só a data (estados antigos guardavam a hora do RDAP)
+        'status': entry.get('status'),
+        'bucket': threshold_bucket(days_left(entry_expiry(entry)), thresholds),
+    }
+
+
+def heartbeat_line(entries, thresholds):
+    """Resumo compacto do lote para o modo --changes-only."""
+    counts = defaultdict(int)
+    for entry in entries.values():
+        counts[entry.get('status')] += 1
+        days = days_left(entry_expiry(entry))
+        for limit in thresholds:
+            if 0 <= days < limit:
+                counts[f'lt{limit}'] += 1
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    fields = [f"domains={len(entries)}", f"ok={counts['ok']}",
+              f"not_found={counts['not_found']}", f"error={counts['error']}"]
+    fields += [f"lt{limit}={counts[f'lt{limit}']}" for limit in thresholds]
+    return f"# heartbeat {now} " + ' '.join(fields)
+
+
+def read_deferred(path):
+    """Lê a lista de domínios adiados na execução anterior (se houver)."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+
 def main():
     parser = argparse.ArgumentParser(description="Verifica expiração de domínios.")
     parser.add_argument('file', help="Arquivo com lista de domínios")
+    parser.add_argument('--no-rdap', action='store_true',
+                        help="Não usar RDAP, apenas whois (porta 43)")
+    parser.add_argument('--rdap-server', metavar='URL',
+                        help="URL base RDAP para todos os TLDs (ex: servidor local de teste)")
+    parser.add_argument('--stats', action='store_true',
+                        help="Mostra tempos por etapa e servidor (p50/p95/p99) no stderr")
+    parser.add_argument('--stats-prom', metavar='ARQUIVO',
+                        help="Grava métricas no formato textfile do Prometheus")
+    parser.add_argument('--stats-zabbix', metavar='ARQUIVO',
+                        help="Grava métricas como entrada do zabbix_sender (-i)")
+    parser.add_argument('--deadline', type=float, metavar='SEGUNDOS',
+                        help="Tempo máximo do lote; domínios lentos vão para o fim ou próxima execução")
+    parser.add_argument('--deferred', metavar='ARQUIVO',
+                        help="Arquivo com domínios adiados (lidos primeiro e regravados ao final)")
+    parser.add_argument('--adaptive-timeouts', action='store_true',
+                        help="Timeout por servidor a partir do p95 das latências observadas")
+    parser.add_argument('--latency-file', metavar='ARQUIVO',
+                        help="Histórico de latências entre execuções (implica --adaptive-timeouts)")
+    parser.add_argument('--state', metavar='ARQUIVO',
+                        help="Modo incremental: guarda os resultados e só consulta domínios novos ou vencidos")
+    parser.add_argument('--max-age', type=float, default=DEFAULT_MAX_AGE_DAYS, metavar='DIAS',
+                        help=f"Validade dos resultados no modo incremental (padrão: {DEFAULT_MAX_AGE_DAYS})")
+    parser.add_argument('--changes-only', action='store_true',
+                        help="Só imprime renovações, limiares cruzados e mudanças de erro (requer --state)")
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, metavar='DIAS,...',
+                        help=f"Limiares de dias para --changes-only (padrão: {DEFAULT_THRESHOLDS})")
+    parser.add_argument('--heartbeat', type=float, default=DEFAULT_HEARTBEAT_HOURS, metavar='HORAS',
+                        help=f"Intervalo da linha de resumo em --changes-only (padrão: {DEFAULT_HEARTBEAT_HOURS}, 0 desliga)")
+    parser.add_argument('--prefetch', action='store_true',
+                        help="Só aquece o cache: renova o que vence nas próximas 24h, sem saída (requer --state)")
+    parser.add_argument('--store', metavar='ARQUIVO',
+                        help="Grava também o arquivo compacto (domain_store.py) lido por check_domain_expiry-v3.py --cache")
+    parser.add_argument('--nodes', metavar='NO1,NO2,...',
+                        help="Nós que dividem a lista (hash consistente por domínio base)")
+    parser.add_argument('--node', default=socket.gethostname(),
+                        help="Nome deste nó em --nodes (padrão: hostname)")
+    parser.add_argument('--coord', metavar='ARQUIVO',
+                        help="Banco SQLite compartilhado com a cota global por servidor")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE_PER_MIN, metavar='POR_MIN',
+                        help=f"Cota global de consultas por minuto por servidor (padrão: {DEFAULT_RATE_PER_MIN})")
 
     args = parser.parse_args()
+    if args.changes_only and not args.state:
+        parser.error("--changes-only requer --state")
+    if (args.prefetch or args.store) and not args.state:
+        parser.error("--prefetch e --store requerem --state")
+    try:
+        thresholds = sorted(int(t) for t in args.thresholds.split(',') if t.strip())
+    except ValueError:
+        parser.error(f"--thresholds inválido: {args.thresholds}")
     domains = read_domains(args.file)
 
-    for domain in domains:
-        days = days_until_expiry(domain)
-        print(f"{domain}: {days}")
-        time.sleep(1.5)  # Evita bloqueio por rate limit (crucial para .com.br e .cn)
+    # Modo distribuído: cada nó fica só com os seus domínios
+    if args.nodes:
+        nodes = [n.strip() for n in args.nodes.split(',') if n.strip()]
+        if args.node not in nodes:
+            parser.error(f"nó '{args.node}' não está em --nodes")
+        ring = HashRing(nodes)
+        domains = [d for d in domains if ring.node_for(registrable_domain(d.lower())) == args.node]
+
+    global stats, timeouts, deadline, retry_pass, coordinator
+    if args.coord:
+        coordinator = Coordinator(args.coord, args.rate)
+    elif args.prefetch:
+        # Cota por servidor só deste processo, no lugar da pausa fixa
+        coordinator = Coordinator(':memory:', args.rate)
+    if args.stats or args.stats_prom or args.stats_zabbix:
+        stats = StageStats()
+    if args.adaptive_timeouts or args.latency_file:
+        timeouts = AdaptiveTimeouts()
+        if args.latency_file:
+            timeouts.load(args.latency_file)
+    if args.deadline:
+        deadline = time.monotonic() + args.deadline
+
+    # A saída segue a ordem do arquivo, qualquer que seja a ordem das consultas
+    file_order = list(domains)
+    output = {}
+
+    # Adiados da execução anterior vão para o início da fila
+    if args.deferred:
+        previous = [d for d in read_deferred(args.deferred) if d in domains]
+        first = set(previous)
+        domains = previous + [d for d in domains if d not in first]
+
+    if args.rdap_server:
+        # Sufixo vazio casa com qualquer domínio
+        RDAP_SERVERS.clear()
+        RDAP_SERVERS[''] = args.rdap_server
+
+    def emit(domain, entry):
+        """Imprime o resultado (no modo --changes-only, só se houve mudança material)."""
+        if args.prefetch:
+            return
+        if args.changes_only:
+            current = material_state(entry, thresholds)
+            if entry.get('reported') == current:
+                return
+            entry['reported'] = current
+        output[domain] = f"{domain}: {days_left(entry_expiry(entry))}"
+
+    def flush_output():
+        """Imprime os resultados acumulados na ordem do arquivo."""
+        for domain in file_order:
+            if domain in output:
+                print(output.pop(domain))
+
+    # Modo incremental: reemite do estado o que ainda é válido e consulta o resto
+    state = {}
+    if args.state:
+        document = load_state(args.state)
+        previous = document['domains']
+        now_ts = time.time()
+        if args.prefetch:
+            now_ts += PREFETCH_AHEAD
+        max_age = args.max_age * 86400
+        state = {d: previous[d] for d in domains if d in previous}  # Remove os que saíram da lista
+        document['domains'] = state
+        fresh = [d for d in domains if not is_stale(d, state.get(d), now_ts, max_age)]
+        for domain in fresh:
+            emit(domain, state[domain])
+        fresh = set(fresh)
+        domains = [d for d in domains if d not in fresh]
+
+    queue = deque(domains)
+    retried = set()
+    deferred = []
+    try:
+        while queue:
+            domain = queue.popleft()
+            retry_pass = domain in retried
+            try:
+                result = check_domain(domain, use_rdap=not args.no_rdap)
+            except DeferDomain:
+                # Lento: uma nova tentativa no fim do lote, depois fica para a próxima execução
+                if domain not in retried and deadline - time.monotonic() >= 1:
+                    retried.add(domain)
+                    queue.append(domain)
+                else:
+                    deferred.append(domain)
+                continue
+            entry = result_to_entry(result, time.time())
+            if args.state:
+                if domain in state and 'reported' in state[domain]:
+                    entry['reported'] = state[domain]['reported']
+                state[domain] = entry
+            emit(domain, entry)
+            pause = 1.5  # Evita bloqueio por rate limit (crucial para .com.br e .cn)
+            if coordinator is not None:
+                pause = 0  # A cota por servidor já espaça as consultas
+            if deadline is not None:
+                pause = max(0, min(pause, deadline - time.monotonic()))
+            with timed('batch', 'sleep'):
+                time.sleep(pause)
+        # Adiados com resultado anterior: reemite o valor antigo em vez de omitir
+        for domain in deferred:
+            if domain in state:
+                emit(domain, state[domain])
+        flush_output()
+
+        if args.changes_only and args.heartbeat > 0:
+            if time.time() - document.get('heartbeat', 0) >= args.heartbeat * 3600:
+                print(heartbeat_line(state, thresholds))
+                document['heartbeat'] = int(time.time())
+    finally:
+        # Interrompido: imprime o que já foi marcado como reportado no estado
+        flush_output()
+        close_rdap_connections()
+        if coordinator is not None:
+            coordinator.close()
+        if args.state:
+            save_state(args.state, document)
+        if args.store:
+            from domain_store import write_store
+            write_store(args.store, state)
+
+    if deferred:
+        print(f"{len(deferred)} domínio(s) adiado(s) por falta de tempo: {' '.join(deferred)}",
+              file=sys.stderr)
+    if args.deferred:
+        write_file_atomic(args.deferred, ''.join(f"{d}\n" for d in deferred))
+    if args.latency_file:
+        timeouts.save(args.latency_file)
+
+    if stats is not None:
+        if args.stats:
+            print(stats.to_text(), file=sys.stderr)
+        if args.stats_prom:
+            write_file_atomic(args.stats_prom, stats.to_prometheus())
+        if args.stats_zabbix:
+            write_file_atomic(args.stats_zabbix, stats.to_zabbix())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Armazenamento compacto dos resultados de expiração para carteiras grandes.
+
+Em vez de um dict por domínio (datetime + strings, centenas de bytes cada),
+guarda colunas em arrays paralelos num único arquivo, mapeado com mmap:
+
+  expiry     int32   dias desde 1970-01-01 (NO_EXPIRY se não houver data)
+  checked    uint32  horário da consulta (epoch, segundos)
+  status     uint8   0=ok, 1=not_found, 2=error
+  server     uint16  índice na tabela de servidores
+  tld        uint16  índice na tabela de TLDs
+  registrar  uint16  índice na tabela de registrars
+
+Os nomes monitorados (as chaves do --state, ex: mail.example.com, em
+minúsculas) ficam ordenados num bloco único, com offsets, permitindo busca
+binária sem criar objetos por domínio. O TLD segue a regra de domínio base do
+checker.
+
+Dias restantes seguem (expiração - agora).days, com a expiração à meia-noite
+(UTC) do dia, o mesmo valor da consulta ao vivo do check_domain_expiry-v3.py.
+
+Uso:
+  python3 domain_store.py build estado.json dominios.store
+  python3 domain_store.py get dominios.store google.com
+  python3 domain_store.py query dominios.store --days 30
+  python3 domain_store.py report dominios.store --thresholds 30,60
+  python3 domain_store.py bench 1000000
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import argparse
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime, timezone, date, timedelta
+
+MAGIC = b'DSTORE01'
+NO_EXPIRY = -2 ** 31
+STATUS_CODES = {'ok': 0, 'not_found': 1, 'error': 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+# Colunas numéricas: nome -> typecode do módulo array
+COLUMNS = {
+    'expiry': 'i',
+    'checked': 'I',
+    'status': 'B',
+    'server': 'H',
+    'tld': 'H',
+    'registrar': 'H',
+}
+
+# Colunas com tabela de nomes (índice uint16 -> string)
+TABLES = {'server': 'servers', 'tld': 'tlds', 'registrar': 'registrars'}
+
+
+def epoch_days(dt):
+    """datetime -> dias desde 1970-01-01 (UTC)."""
+    return int(dt.timestamp() // 86400)
+
+
+def base_day(now=None):
+    """
+    Dia (desde 1970-01-01) a descontar da expiração para obter os dias restantes:
+    (expiry * 86400 - now) // 86400 == expiry - base_day(now).
+    """
+    now = time.time() if now is None else now
+    return int(-(-now // 86400))
+
+
+def tld_of(domain):
+    """Sufixo do domínio, com a mesma regra de domínio base do checker (.com.br, .com)."""
+    parts = domain.split('.')
+    if len(parts) >= 3 and parts[-2] in ['com', 'net', 'org', 'co'] and len(parts[-1]) == 2:
+        return '.' + '.'.join(parts[-2:])
+    return '.' + parts[-1]
+
+
+def _padding(size, align=8):
+    return (-size) % align
+
+
+def write_store(path, entries):
+    """
+    Grava o arquivo compacto a partir de {dominio: {expiry, status, server, checked}}
+    (o mesmo formato do --state do check_domains_from_file-v2.py).
+    Nomes que diferem só em maiúsculas ficam com a consulta mais recente.
+    """
+    latest = {}
+    for name, entry in entries.items():
+        key = name.lower()
+        if key not in latest or (entry.get('checked') or 0) > (entries[latest[key]].get('checked') or 0):
+            latest[key] = name
+    names = sorted(latest)
+    tables = {column: [] for column in TABLES}
+    table_ids = {column: {} for column in TABLES}
+    columns = {name: array(code) for name, code in COLUMNS.items()}
+    offsets = array('I', [0])
+    blob = bytearray()
+
+    def intern(column, value):
+        ids = table_ids[column]
+        if value not in ids:
+            ids[value] = len(tables[column])
+            tables[column].append(value)
+        return ids[value]
+
+    for name in names:
+        entry = entries[latest[name]]
+        expiry = entry.get('expiry')
+        columns['expiry'].append(epoch_days(datetime.fromisoformat(expiry)) if expiry else NO_EXPIRY)
+        columns['checked'].append(int(entry.get('checked') or 0))
+        columns['status'].append(STATUS_CODES.get(entry.get('status'), STATUS_CODES['error']))
+        columns['server'].append(intern('server', entry.get('server') or ''))
+        columns['tld'].append(intern('tld', tld_of(name)))
+        columns['registrar'].append(intern('registrar', entry.get('registrar') or ''))
+        blob += name.encode('utf-8')
+        offsets.append(len(blob))
+
+    # Seções alinhadas em 8 bytes, na ordem do cabeçalho
+    sections = [(name, columns[name]) for name in COLUMNS]
+    sections += [('offsets', offsets), ('names', blob)]
+    layout = {}
+    position = 0
+    for name, data in sections:
+        layout[name] = [position, len(data) * (data.itemsize if isinstance(data, array) else 1)]
+        position += layout[name][1] + _padding(layout[name][1])
+
+    header = json.dumps({
+        'count': len(names),
+        'sections': layout,
+        **{TABLES[column]: values for column, values in tables.items()},
+    }).encode('utf-8')
+    header += b' ' * _padding(len(MAGIC) + 4 + len(header))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        for name, data in sections:
+            raw = data.tobytes() if isinstance(data, array) else bytes(data)
+            f.write(raw)
+            f.write(b'\0' * _padding(len(raw)))
+    os.replace(tmp_path, path)
+    return len(names)
+
+
+class DomainStore:
+    """Leitura do arquivo compacto via mmap (sem carregar objetos por domínio)."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path}: não é um arquivo domain_store")
+        header_len = struct.unpack_from('<I', self._mmap, len(MAGIC))[0]
+        start = len(MAGIC) + 4
+        header = json.loads(self._mmap[start:start + header_len])
+        base = start + header_len
+
+        self.count = header['count']
+        self.servers = header['servers']
+        self.tlds = header['tlds']
+        self.registrars = header['registrars']
+        view = memoryview(self._mmap)
+        self._views = [view]
+
+        def section(name, code=None):
+            offset, size = header['sections'][name]
+            data = view[base + offset:base + offset + size]
+            self._views.append(data)
+            if code:
+                data = data.cast(code)
+                self._views.append(data)
+            return data
+
+        self.expiry = section('expiry', COLUMNS['expiry'])
+        self.checked = section('checked', COLUMNS['checked'])
+        self.status = section('status', COLUMNS['status'])
+        self.server = section('server', COLUMNS['server'])
+        self.tld = section('tld', COLUMNS['tld'])
+        self.registrar = section('registrar', COLUMNS['registrar'])
+        self.offsets = section('offsets', 'I')
+        self.names = section('names')
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def name(self, index):
+        return bytes(self.names[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def index(self, domain):
+        """Busca binária pelo nome (sem diferenciar maiúsculas); retorna o índice ou -1."""
+        domain = domain.lower()
+        key = domain.encode('utf-8')
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if bytes(self.names[self.offsets[mid]:self.offsets[mid + 1]]) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.count and self.name(low) == domain:
+            return low
+        return -1
+
+    def get(self, domain):
+        """Registro de um domínio como dict, ou None."""
+        i = self.index(domain)
+        if i < 0:
+            return None
+        return {
+            'expiry_days': None if self.expiry[i] == NO_EXPIRY else self.expiry[i],
+            'checked': self.checked[i],
+            'status': STATUS_NAMES[self.status[i]],
+            'server': self.servers[self.server[i]],
+            'tld': self.tlds[self.tld[i]],
+            'registrar': self.registrars[self.registrar[i]] or None,
+        }
+
+    def days_left(self, index, now=None):
+        """Dias até a expiração (-1 se não houver data), como na consulta ao vivo."""
+        expiry = self.expiry[index]
+        if expiry == NO_EXPIRY:
+            return -1
+        return expiry - base_day(now)
+
+    def expiring_within(self, days, now=None):
+        """
+        Índices com 0 <= dias restantes < days: os que vencem nos próximos dias.
+        Ao contrário dos triggers '< 30', deixa de fora os já vencidos.
+        """
+        start = base_day(now)
+        limit = start + days
+        return [i for i, expiry in enumerate(self.expiry) if start <= expiry < limit]
+
+
+def report(store, thresholds=(30, 60), now=None):
+    """
+    Relatório completo numa única passada sobre as colunas: agrupa por
+    (expiração, tld, registrar, status) e deriva tudo dos grupos, que são
+    poucos milhares mesmo para milhões de domínios.
+    """
+    start = base_day(now)
+    thresholds = sorted(thresholds)
+    groups = Counter(zip(store.expiry, store.tld, store.registrar, store.status))
+
+    result = {
+        'total': len(store),
+        'status': defaultdict(int),
+        'expired': 0,
+        'thresholds': {f'lt{limit}': 0 for limit in thresholds},
+        'months': defaultdict(int),
+        'tld': defaultdict(lambda: {'total': 0, **{f'lt{limit}': 0 for limit in thresholds}}),
+        'registrar': defaultdict(lambda: {'total': 0, **{f'lt{limit}': 0 for limit in thresholds}}),
+    }
+    month_of = {}
+    for (expiry, tld, registrar, status), n in groups.items():
+        result['status'][STATUS_NAMES[status]] += n
+        tld_row = result['tld'][store.tlds[tld]]
+        registrar_row = result['registrar'][store.registrars[registrar] or '-']
+        tld_row['total'] += n
+        registrar_row['total'] += n
+        if expiry == NO_EXPIRY:
+            continue
+        days = expiry - start
+        if days < 0:
+            result['expired'] += n
+        # Mesma semântica dos triggers do template: last() < limite, inclusive os vencidos
+        for limit in thresholds:
+            if days < limit:
+                key = f'lt{limit}'
+                result['thresholds'][key] += n
+                tld_row[key] += n
+                registrar_row[key] += n
+        if days < 0:
+            continue
+        if expiry not in month_of:
+            month_of[expiry] = (date(1970, 1, 1) + timedelta(days=expiry)).strftime('%Y-%m')
+        result['months'][month_of[expiry]] += n
+    return result
+
+
+def format_report(result, thresholds):
+    thresholds = sorted(thresholds)
+    lines = [f"total: {result['total']}"]
+    lines += [f"{status}: {n}" for status, n in sorted(result['status'].items())]
+    lines.append(f"expirados: {result['expired']}")
+    lines += [f"< {limit} dias (com expirados): {result['thresholds'][f'lt{limit}']}" for limit in thresholds]
+
+    lines.append('')
+    lines.append('expirações por mês:')
+    lines += [f"  {month}: {n}" for month, n in sorted(result['months'].items())]
+
+    for key, title in (('tld', 'TLD'), ('registrar', 'registrar')):
+        lines.append('')
+        header = f"{title:<40} {'total':>9}" + ''.join(f" {'< ' + str(limit):>9}" for limit in thresholds)
+        lines.append(header)
+        rows = sorted(result[key].items(), key=lambda item: -item[1]['total'])
+        for name, row in rows:
+            lines.append(f"{name[:40]:<40} {row['total']:>9}"
+                         + ''.join(f" {row[f'lt{limit}']:>9}" for limit in thresholds))
+    return '\n'.join(lines)
+
+
+def _synthetic_entries(count):
+    """Entradas no formato do --state para o benchmark."""
+    servers = ['rdap.verisign.com', 'whois.registro.br', 'whois.cnnic.cn', 'whois.pir.org']
+    registrars = ['MarkMonitor Inc.', 'GoDaddy.com, LLC', 'Registro.br', None, 'Namecheap, Inc.']
+    tlds = ['.com', '.com.br', '.cn', '.org']
+    now = int(time.time())
+    entries = {}
+    for i in range(count):
+        expiry = datetime.fromtimestamp(now + (i * 7919) % (800 * 86400), timezone.utc)
+        entries[f"dominio{i}{tlds[i % 4]}"] = {
+            'expiry': expiry.isoformat(),
+            'status': 'ok' if i % 50 else 'error',
+            'server': servers[i % 4],
+            'registrar': registrars[i % 5],
+            'checked': now - i % 86400,
+        }
+    return entries
+
+
+def benchmark(count, path):
+    """Compara a memória de dicts (datetime + strings) com o arquivo mapeado."""
+    import gc
+    import tracemalloc
+
+    entries = _synthetic_entries(count)
+    write_store(path, entries)
+
+    gc.collect()
+    tracemalloc.start()
+    # Abordagem por dicts: como os resultados ficam em memória no checker
+    results = {
+        name: {
+            'expiry': datetime.fromisoformat(entry['expiry']),
+            'status': entry['status'],
+            'server': entry['server'],
+            'checked': float(entry['checked']),
+        }
+        for name, entry in entries.items()
+    }
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    del results
+    gc.collect()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+
+    store = DomainStore(path)
+    store_heap = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    store.close()
+    file_bytes = os.path.getsize(path)
+
+    print(f"domínios: {count}")
+    print(f"dicts:    {dict_bytes:>12} bytes  ({dict_bytes / count:.0f} bytes/domínio)")
+    print(f"store:    {file_bytes:>12} bytes mapeados + {store_heap} bytes de heap "
+          f"({file_bytes / count:.0f} bytes/domínio)")
+
+    # Tempos medidos sem o tracemalloc, que deixa o Python bem mais lento
+    with DomainStore(path) as store:
+        start = time.perf_counter()
+        expiring = len(store.expiring_within(30))
+        print(f"consulta '< 30 dias': {expiring} domínios em {(time.perf_counter() - start) * 1000:.1f} ms")
+        start = time.perf_counter()
+        report(store)
+        print(f"relatório completo: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Armazenamento compacto de resultados de expiração.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_build = sub.add_parser('build', help="Gera o arquivo compacto a partir do --state do checker")
+    p_build.add_argument('state', help="Arquivo de estado (JSON)")
+    p_build.add_argument('store', help="Arquivo compacto de saída")
+
+    p_get = sub.add_parser('get', help="Mostra os dias restantes de um domínio")
+    p_get.add_argument('store')
+    p_get.add_argument('domain')
+
+    p_query = sub.add_parser('query', help="Lista domínios que vencem nos próximos N dias (sem os expirados)")
+    p_query.add_argument('store')
+    p_query.add_argument('--days', type=int, default=30)
+
+    p_report = sub.add_parser('report', help="Limiares, expirações por mês, por TLD e por registrar")
+    p_report.add_argument('store')
+    p_report.add_argument('--thresholds', default='30,60', metavar='DIAS,...',
+                          help="Limiares em dias (padrão: 30,60, como no template)")
+    p_report.add_argument('--json', action='store_true', help="Saída em JSON")
+
+    p_bench = sub.add_parser('bench', help="Compara memória de dicts x arquivo compacto")
+    p_bench.add_argument('count', type=int, nargs='?', default=1000000)
+    p_bench.add_argument('--file', default='/tmp/domain_store_bench.store')
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        try:
+            with open(args.state, 'r', encoding='utf-8') as f:
+                entries = json.load(f)['domains']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Erro ao ler {args.state}: {e}", file=sys.stderr)
+            sys.exit(1)
+        write_store(args.store, entries)
+    elif args.command == 'get':
+        with DomainStore(args.store) as store:
+            index = store.index(args.domain.strip().lower())
+            print(store.days_left(index) if index >= 0 else -1)
+    elif args.command == 'query':
+        with DomainStore(args.store) as store:
+            now = time.time()
+            for i in store.expiring_within(args.days, now):
+                print(f"{store.name(i)}: {store.days_left(i, now)}")
+    elif args.command == 'report':
+        try:
+            thresholds = [int(t) for t in args.thresholds.split(',') if t.strip()]
+        except ValueError:
+            parser.error(f"--thresholds inválido: {args.thresholds}")
+        with DomainStore(args.store) as store:
+            result = report(store, thresholds)
+        if args.json:
+            print(json.dumps(result, indent=1, sort_keys=True))
+        else:
+            print(format_report(result, thresholds))
+    elif args.command == 'bench':
+        benchmark(args.count, args.file)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,12 +5,31 @@
 # Suporta: .com, .cn, .com.br, .org, .net, .info, etc.
 # Modo 1: ./check_domain_expiry.sh dominio.com
 #         → Retorna: 123  (ou -1 se erro)
-# Modo 2: ./check_domain_expiry.sh arquivo.txt
+# Modo 2: ./check_domain_expiry.sh [-j 4] [-s 1] [-c 3] arquivo.txt
 #         → Retorna: dominio.com: 123
 #                   outro.com.br: 45
+#         -j  consultas whois em paralelo (padrão: 4)
+#         -s  intervalo mínimo, em segundos, entre consultas do mesmo TLD (padrão: 1)
+#         -c  intervalo para .cn, o cnnic bloqueia com mais facilidade (padrão: 3)
+#         A saída mantém a ordem do arquivo.
+# Requer bash >= 4.3 (wait -n, printf %(...)T)
 # by: neviim jads (versão estendida)
 # ---------------------------------------------------------
 
+JOBS=4
+TLD_SPACING=1
+CN_SPACING=3
+
+while getopts "j:s:c:" opt; do
+    case "$opt" in
+        j) JOBS="$OPTARG" ;;
+        s) TLD_SPACING="$OPTARG" ;;
+        c) CN_SPACING="$OPTARG" ;;
+        *) echo -1; exit 1 ;;
+    esac
+done
+shift $((OPTIND - 1))
+
 DOMAIN_OR_FILE="$1"
 
 # Verifica se foi passado argumento
@@ -19,117 +38,187 @@ if [ -z "$DOMAIN_OR_FILE" ]; then
     exit 1
 fi
 
-# Função: normaliza domínio
+# Fuso local em segundos (a data de expiração é meia-noite local, como no date -d)
+printf -v TZ_OFFSET '%(%z)T' -1
+TZ_OFFSET_SECONDS=$(( ${TZ_OFFSET:0:1}1 * (10#${TZ_OFFSET:1:2} * 3600 + 10#${TZ_OFFSET:3:2} * 60) ))
+
+# Função: normaliza domínio (só builtins; resultado em NORMALIZED, sem subshell)
 normalize_domain() {
-    local d="$1"
-    echo "$d" | sed -E 's|https?://||i' | sed 's|/.*$||' | sed 's|www\.||' | tr -d ' ' | tr '[:upper:]' '[:lower:]'
+    local d="${1,,}"
+    d="${d/http:\/\//}"
+    d="${d/https:\/\//}"
+    d="${d%%/*}"
+    d="${d/www./}"
+    NORMALIZED="${d// /}"
 }
 
-# Função: extrai e formata data de expiração
-extract_expiry() {
-    local whois_output="$1"
-    local expiry=""
-
-    # Extrai possíveis datas com múltiplos formatos
-    expiry=$(echo "$whois_output" | \
-             grep -iE 'Expiry|Expiration|Expires|Registry Expiry|renewal date|paid-till|validity|fecha de vencimiento|data de expiração|vencimento|Expiration Time' | \
-             grep -oE '[0-9]{4}-[0-9]{2}-[0-9]{2}([T ]?[0-9]{2}:[0-9]{2}:[0-9]{2})?|[0-9]{2}-[A-Za-z]{3}-[0-9]{4}|[0-9]{2}/[0-9]{2}/[0-9]{4}|[0-9]{8}' | \
-             head -1 | \
-             sed 's/T.*$//' | sed 's/ .*$//' | sed 's|/|-|g')
-
-    [ -z "$expiry" ] && return 1
-
-    # Converte para YYYY-MM-DD
-    case "$expiry" in
-        *[A-Za-z]*)
-            # Formato: 21-feb-2025
-            echo "$expiry" | awk '{
-                split($0, a, /[-\.]/); 
-                day = a[1]; 
-                year = a[3]; 
-                if (year < 100) year += 2000;
-                month_str = tolower(substr(a[2],1,3)); 
-                map["jan"]=1; map["fev"]=2; map["mar"]=3; map["abr"]=4; map["mai"]=5; map["jun"]=6;
-                map["jul"]=7; map["ago"]=8; map["set"]=9; map["out"]=10; map["nov"]=11; map["dez"]=12;
-                map["feb"]=2; map["apr"]=4; map["may"]=5; map["aug"]=8; map["sep"]=9; map["oct"]=10; 
-                map["nov"]=11; map["dec"]=12;
-                if (map[month_str]) printf "%d-%02d-%02d", year, map[month_str], day; else exit 1
-            }'
-            ;;
-        [0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9])
-            # Já é YYYY-MM-DD
-            echo "$expiry"
-            ;;
-        [0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9])
-            # YYYYMMDD → YYYY-MM-DD
-            echo "$expiry" | sed 's/\([0-9]\{4\}\)\([0-9]\{2\}\)\([0-9]\{2\}\)/\1-\2-\3/'
-            ;;
-        *)
-            return 1
-            ;;
-    esac
+# Programa awk: verifica erros, extrai a data e calcula os dias numa única passada.
+# Imprime os dias restantes ou -1.
+read -r -d '' EXPIRY_AWK <<'AWK'
+function civil(y, m, d,    era, yoe, doy, doe) {
+    # Dias desde 1970-01-01 (algoritmo days_from_civil)
+    y -= (m <= 2)
+    era = int((y >= 0 ? y : y - 399) / 400)
+    yoe = y - era * 400
+    doy = int((153 * (m + (m > 2 ? -3 : 9)) + 2) / 5) + d - 1
+    doe = yoe * 365 + int(yoe / 4) - int(yoe / 100) + doy
+    return era * 146097 + doe - 719468
 }
+function month_days(y, m) {
+    if (m == 2) return (y % 4 == 0 && (y % 100 != 0 || y % 400 == 0)) ? 29 : 28
+    return (m == 4 || m == 6 || m == 9 || m == 11) ? 30 : 31
+}
+BEGIN {
+    split("jan fev mar abr mai jun jul ago set out nov dez", pt, " ")
+    split("jan feb mar apr may jun jul aug sep oct nov dec", en, " ")
+    for (i = 1; i <= 12; i++) { month[pt[i]] = i; month[en[i]] = i }
+}
+{ line = tolower($0) }
+line ~ /not found|no match|no data|error|invalid|malformed|não encontrado|no entries found/ { error = 1 }
+found == "" && line ~ /expiry|expiration|expires|registry expiry|renewal date|paid-till|validity|fecha de vencimiento|data de expiração|vencimento|expiration time/ {
+    if (match(line, /[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]|[0-9][0-9]-[a-z][a-z][a-z]-[0-9][0-9][0-9][0-9]|[0-9][0-9]\/[0-9][0-9]\/[0-9][0-9][0-9][0-9]|[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]/))
+        found = substr(line, RSTART, RLENGTH)
+}
+END {
+    if (error || found == "") { print -1; exit }
+    if (found ~ /^[0-9]+$/) {
+        # YYYYMMDD
+        y = substr(found, 1, 4) + 0; m = substr(found, 5, 2) + 0; d = substr(found, 7, 2) + 0
+    } else if (found ~ /-[a-z]/) {
+        # 21-feb-2025
+        split(found, a, "-"); d = a[1] + 0; m = month[a[2]] + 0; y = a[3] + 0
+    } else if (found ~ /-/) {
+        # YYYY-MM-DD
+        split(found, a, "-"); y = a[1] + 0; m = a[2] + 0; d = a[3] + 0
+    } else {
+        # DD/MM/YYYY: formato ambíguo, não suportado
+        print -1; exit
+    }
+    if (m < 1 || m > 12 || d < 1 || d > month_days(y, m)) { print -1; exit }
+    print int((civil(y, m, d) * 86400 - tzoff - now) / 86400)
+}
+AWK
 
 # Função: verifica um único domínio e retorna dias
+# Processos por domínio: timeout + whois + awk
 check_single_domain() {
-    local domain="$1"
-    local output expiry_date expiry_ts now_ts days
+    local domain now
 
     # Normaliza
-    domain=$(normalize_domain "$domain")
+    normalize_domain "$1"
+    domain="$NORMALIZED"
     [ -z "$domain" ] && echo -1 && return
 
+    printf -v now '%(%s)T' -1
+
     # Força whois para .cn
     if [[ "$domain" == *.cn ]]; then
-        WHOIS_CMD="whois -h whois.cnnic.cn '$domain'"
+        timeout 15 whois -h whois.cnnic.cn "$domain" 2>&1
     else
-        WHOIS_CMD="whois '$domain'"
-    fi
+        timeout 15 whois "$domain" 2>&1
+    fi | awk -v now="$now" -v tzoff="$TZ_OFFSET_SECONDS" "$EXPIRY_AWK"
+}
 
-    # Executa whois com timeout
-    local whois_output
-    whois_output=$(timeout 15 bash -c "$WHOIS_CMD" 2>&1) || true
+# Converte segundos (ex: 1.5) em microssegundos
+to_usec() {
+    local int="${1%%.*}" frac=""
+    [[ "$1" == *.* ]] && frac="${1#*.}"
+    frac="${frac}000000"
+    REPLY=$(( 10#${int:-0} * 1000000 + 10#${frac:0:6} ))
+}
 
-    # Verifica erros
-    if echo "$whois_output" | grep -qiE 'not found|no match|no data|error|invalid|malformed|não encontrado|no entries found'; then
-        echo -1
-        return
+# Horário atual em microssegundos (EPOCHREALTIME no bash 5, senão segundos)
+now_usec() {
+    if [ -n "$EPOCHREALTIME" ]; then
+        REPLY="${EPOCHREALTIME/[.,]/}"
+    else
+        printf -v REPLY '%(%s)T' -1
+        REPLY=$(( REPLY * 1000000 ))
     fi
+}
 
-    # Extrai data
-    expiry_date=$(extract_expiry "$whois_output")
-    if [ -z "$expiry_date" ]; then
-        echo -1
-        return
-    fi
+# Modo arquivo: consultas em paralelo, respeitando o intervalo por TLD
+check_file() {
+    local file="$1" line domain tld i n queued=0 running=0 wait_usec
+    local -a domains order
+    local -A groups last_start
 
-    # Valida data
-    if ! date -d "$expiry_date" >/dev/null 2>&1; then
-        echo -1
-        return
-    fi
+    to_usec "$TLD_SPACING"; local tld_usec="$REPLY"
+    to_usec "$CN_SPACING"; local cn_usec="$REPLY"
 
-    # Calcula dias
-    expiry_ts=$(date -d "$expiry_date" +%s)
-    now_ts=$(date +%s)
-    days=$(( (expiry_ts - now_ts) / 86400 ))
-    echo "$days"
+    while IFS= read -r line || [ -n "$line" ]; do
+        line="${line#"${line%%[![:space:]]*}"}"
+        line="${line%"${line##*[![:space:]]}"}"
+        [ -z "$line" ] && continue
+        [ "${line:0:1}" = "#" ] && continue
+        normalize_domain "$line"
+        domains+=("$NORMALIZED")
+        # Linha que fica vazia após normalizar (ex: "www.") não é consultada: sai -1
+        [ -z "$NORMALIZED" ] && continue
+        tld="${NORMALIZED##*.}"
+        groups["${tld:-.}"]+="${#domains[@]} "
+        queued=$(( queued + 1 ))
+    done < "$file"
+
+    n=${#domains[@]}
+    [ "$n" -eq 0 ] && return
+
+    # Intercala os TLDs (round-robin) para não esperar o intervalo do mesmo TLD em sequência
+    while [ "${#order[@]}" -lt "$queued" ]; do
+        for tld in "${!groups[@]}"; do
+            [ -z "${groups[$tld]}" ] && continue
+            order+=("${groups[$tld]%% *}")
+            groups[$tld]="${groups[$tld]#* }"
+        done
+    done
+
+    local tmpdir
+    tmpdir=$(mktemp -d) || return 1
+    trap 'rm -rf "$tmpdir"; trap - RETURN' RETURN
+
+    for i in "${order[@]}"; do
+        domain="${domains[i - 1]}"
+        tld="${domain##*.}"
+        tld="${tld:-.}"
+
+        # Limita o número de consultas simultâneas (antes do intervalo, que conta do início real)
+        if [ "$running" -ge "$JOBS" ]; then
+            wait -n
+            running=$(( running - 1 ))
+        fi
+
+        # Espera o intervalo mínimo desde a última consulta deste TLD
+        now_usec
+        if [ -n "${last_start[$tld]}" ]; then
+            if [ "$tld" = "cn" ]; then wait_usec=$cn_usec; else wait_usec=$tld_usec; fi
+            wait_usec=$(( last_start[$tld] + wait_usec - REPLY ))
+            if [ "$wait_usec" -gt 0 ]; then
+                printf -v wait_usec '%d.%06d' $(( wait_usec / 1000000 )) $(( wait_usec % 1000000 ))
+                sleep "$wait_usec"
+                now_usec
+            fi
+        fi
+        last_start[$tld]=$REPLY
+
+        check_single_domain "$domain" > "$tmpdir/$i" &
+        running=$(( running + 1 ))
+    done
+    wait
+
+    # Saída na ordem do arquivo
+    for (( i = 1; i <= n; i++ )); do
+        line=""
+        [ -f "$tmpdir/$i" ] && read -r line < "$tmpdir/$i"
+        echo "${domains[i - 1]}: ${line:--1}"
+    done
 }
 
 # Decisão: arquivo ou domínio?
 if [ -f "$DOMAIN_OR_FILE" ]; then
     # Modo: arquivo
-    while IFS= read -r line || [ -n "$line" ]; do
-        trimmed=$(echo "$line" | sed 's/^[[:space:]]*//; s/[[:space:]]*$//')
-        [ -z "$trimmed" ] && continue
-        [ "${trimmed:0:1}" = "#" ] && continue
-
-        domain=$(normalize_domain "$trimmed")
-        days=$(check_single_domain "$domain")
-        echo "$domain: $days"
-    done < "$DOMAIN_OR_FILE"
+    check_file "$DOMAIN_OR_FILE"
 else
     # Modo: domínio único
     result=$(check_single_domain "$DOMAIN_OR_FILE")
     echo "$result"
-fi
\ No newline at end of file
+fi
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Verifica a sincronização de hora (chrony) em vários servidores em paralelo.
+
+Substitui o laço serial do check-chrony-servers.sh: as conexões SSH rodam em
+paralelo (limite configurável), reaproveitando conexões via ControlMaster, com
+prazo global para o lote inteiro. A saída de `chronyc tracking` e
+`timedatectl` é convertida em campos numéricos.
+
+Uso:
+  python3 check_chrony_servers.py 10.10.0.5 10.10.0.6
+  python3 check_chrony_servers.py -f servidores.txt --concurrency 50 --deadline 30
+  python3 check_chrony_servers.py -f servidores.txt --json
+  python3 check_chrony_servers.py -f servidores.txt --zabbix-server zabbix.local --zabbix-host chrony-fleet
+
+Campos por servidor:
+  reachable     SSH e `chronyc tracking` executados
+  stratum       stratum do chrony
+  offset        diferença do relógio em segundos (positivo = adiantado)
+  frequency     deriva do relógio em ppm (positivo = adiantando)
+  rms_offset    média quadrática dos últimos offsets, em segundos
+  root_delay / root_dispersion  em segundos
+  reference_id  servidor de referência (ex: A9FEA97B (169.254.169.123))
+  synchronized  'System clock synchronized' do timedatectl (ausente sem systemd)
+  ntp_active    'NTP service' do timedatectl (ausente sem systemd)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import subprocess
+
+# --- Lista padrão de servidores (pode ser nomes ou IPs)
+SERVERS = [
+    '10.10.0.5',
+]
+
+SSH_CONNECT_TIMEOUT = 10
+DEFAULT_CONCURRENCY = 32
+DEFAULT_DEADLINE = 60
+
+# Itens trapper no Zabbix: chave -> campo do resultado
+ZABBIX_ITEMS = {
+    'chrony.offset': 'offset',
+    'chrony.frequency': 'frequency',
+    'chrony.rms_offset': 'rms_offset',
+    'chrony.root_delay': 'root_delay',
+    'chrony.root_dispersion': 'root_dispersion',
+    'chrony.stratum': 'stratum',
+    'chrony.refid': 'reference_id',
+    'chrony.synchronized': 'synchronized',
+    'chrony.ntp_active': 'ntp_active',
+}
+
+# Separador entre as saídas dos comandos remotos
+# timedatectl é opcional (hosts sem systemd): não altera o código de saída
+MARKER = '##chrony-check##'
+REMOTE_COMMAND = (
+    f"LC_ALL=C chronyc tracking; echo '{MARKER}'; "
+    f"LC_ALL=C timedatectl status --no-pager 2>/dev/null || true"
+)
+SSH_ERROR = 255  # Código de saída do ssh quando a conexão falha
+SENDER_PARTIAL = 2  # zabbix_sender: parte dos valores recusada pelo servidor
+
+
+def ssh_command(ssh, host, control_dir):
+    """Monta o comando ssh com multiplexação de conexões (ControlMaster)."""
+    return [
+        ssh, '-q',
+        '-o', 'BatchMode=yes',
+        '-o', f'ConnectTimeout={SSH_CONNECT_TIMEOUT}',
+        '-o', 'ControlMaster=auto',
+        # %C: hash da conexão, curto o bastante para o limite de caminho de socket unix
+        '-o', f'ControlPath={control_dir}/cm-%C',
+        '-o', 'ControlPersist=120',
+        host, REMOTE_COMMAND,
+    ]
+
+
+def parse_tracking(text):
+    """Extrai stratum, offset e reference_id da saída de `chronyc tracking`."""
+    result = {}
+    match = re.search(r'^Reference ID\s*:\s*(.+)$', text, re.MULTILINE)
+    if match:
+        result['reference_id'] = match.group(1).strip()
+    match = re.search(r'^Stratum\s*:\s*(\d+)', text, re.MULTILINE)
+    if match:
+        result['stratum'] = int(match.group(1))
+    # Ex: "System time     : 0.000012345 seconds slow of NTP time"
+    match = re.search(r'^System time\s*:\s*([\d.]+)\s+seconds\s+(fast|slow)', text, re.MULTILINE)
+    if match:
+        offset = float(match.group(1))
+        result['offset'] = offset if match.group(2) == 'fast' else -offset
+    # Ex: "Frequency       : 12.345 ppm slow"
+    match = re.search(r'^Frequency\s*:\s*([\d.]+)\s+ppm\s+(fast|slow)', text, re.MULTILINE)
+    if match:
+        frequency = float(match.group(1))
+        result['frequency'] = frequency if match.group(2) == 'fast' else -frequency
+    for label, field in (('RMS offset', 'rms_offset'), ('Root delay', 'root_delay'),
+                         ('Root dispersion', 'root_dispersion')):
+        match = re.search(rf'^{label}\s*:\s*([\d.]+)\s+seconds', text, re.MULTILINE)
+        if match:
+            result[field] = float(match.group(1))
+    match = re.search(r'^Leap status\s*:\s*(.+)$', text, re.MULTILINE)
+    if match:
+        result['leap_status'] = match.group(1).strip()
+    return result
+
+
+def parse_timedatectl(text):
+    """Extrai sincronização e estado do serviço NTP da saída de `timedatectl`."""
+    result = {}
+    match = re.search(r'System clock synchronized:\s*(\w+)', text)
+    if match:
+        result['synchronized'] = match.group(1).lower() == 'yes'
+    match = re.search(r'NTP service:\s*(\w+)', text)
+    if match:
+        result['ntp_active'] = match.group(1).lower() == 'active'
+    return result
+
+
+def parse_output(text):
+    tracking, _, timedatectl = text.partition(MARKER)
+    result = parse_tracking(tracking)
+    result.update(parse_timedatectl(timedatectl))
+    return result
+
+
+async def check_server(host, args, semaphore, deadline):
+    """Executa os comandos remotos em um servidor, dentro do prazo global."""
+    result = {'host': host, 'reachable': False}
+    async with semaphore:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            result['error'] = 'prazo esgotado'
+            return result
+
+        start = time.monotonic()
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *ssh_command(args.ssh, host, args.control_dir),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,  # Permite matar o grupo inteiro no prazo
+            )
+        except OSError as e:
+            result['error'] = str(e)
+            return result
+
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=remaining)
+        except asyncio.TimeoutError:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            result['error'] = 'prazo esgotado'
+            return result
+        finally:
+            result['elapsed'] = round(time.monotonic() - start, 3)
+
+    output = stdout.decode('utf-8', errors='replace')
+    result.update(parse_output(output))
+    # Acessível = ssh conectou e o chronyc respondeu; o timedatectl é opcional
+    if proc.returncode == SSH_ERROR or 'stratum' not in result:
+        result['error'] = (stderr.decode('utf-8', errors='replace').strip()
+                           or f"ssh retornou {proc.returncode}")
+        return result
+    result['reachable'] = True
+    return result
+
+
+async def check_all(hosts, args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    deadline = time.monotonic() + args.deadline
+    return await asyncio.gather(*(check_server(h, args, semaphore, deadline) for h in hosts))
+
+
+def read_hosts(file_path):
+    """Lê servidores de um arquivo, um por linha (# para comentários)."""
+    hosts = []
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.split('#', 1)[0].strip()
+                if line:
+                    hosts.append(line)
+    except OSError as e:
+        print(f"Erro ao ler {file_path}: {e}", file=sys.stderr)
+        sys.exit(1)
+    return hosts
+
+
+def _sender_value(value):
+    """Valor no formato de entrada do zabbix_sender (booleanos como 1/0, texto entre aspas)."""
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return f"{value:.9f}"
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def zabbix_lines(results, zabbix_host):
+    """
+    Entrada do zabbix_sender (-i) para o lote inteiro: lista LLD dos servidores
+    ({#HOST}) e um valor por item e servidor. Envia os campos que foram lidos
+    (sem timedatectl, por exemplo, não há synchronized/ntp_active).
+    """
+    discovery = [{'{#HOST}': r['host']} for r in results]
+    lines = [f"{zabbix_host} chrony.discovery {_sender_value(json.dumps(discovery))}"]
+    for result in results:
+        host = result['host']
+        lines.append(f"{zabbix_host} chrony.reachable[{host}] {int(result['reachable'])}")
+        for key, field in ZABBIX_ITEMS.items():
+            if field in result:
+                lines.append(f"{zabbix_host} {key}[{host}] {_sender_value(result[field])}")
+    return '\n'.join(lines) + '\n'
+
+
+def zabbix_send(data, args):
+    """Envia todos os valores numa única chamada do zabbix_sender."""
+    cmd = [args.zabbix_sender]
+    if args.zabbix_server:
+        cmd += ['-z', args.zabbix_server]
+    if args.zabbix_config:
+        cmd += ['-c', args.zabbix_config]
+    cmd += ['-i', '-']
+    try:
+        result = subprocess.run(cmd, input=data, capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"Erro ao executar zabbix_sender: {e}", file=sys.stderr)
+        return False
+    if result.returncode == SENDER_PARTIAL:
+        # Normal na primeira execução e a cada servidor novo: o LLD ainda não criou os itens
+        print(f"zabbix_sender: envio parcial: {result.stdout.strip()}", file=sys.stderr)
+        return True
+    if result.returncode != 0:
+        print(f"zabbix_sender: {result.stdout.strip()} {result.stderr.strip()}", file=sys.stderr)
+        return False
+    return True
+
+
+def format_result(result):
+    if not result['reachable']:
+        return f"{result['host']:<30} \033[0;31mERRO: {result.get('error', 'falha')}\033[0m"
+    offset = result.get('offset')
+    offset = f"{offset:+.9f}s" if offset is not None else '?'
+    synced = {True: 'sim', False: 'não'}.get(result.get('synchronized'), '?')
+    return (f"{result['host']:<30} stratum={result.get('stratum', '?'):<3} "
+            f"offset={offset} sincronizado={synced} "
+            f"ref={result.get('reference_id', '?')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica sincronização de hora (chrony) em vários servidores.")
+    parser.add_argument('hosts', nargs='*', help="Servidores (padrão: lista SERVERS do script)")
+    parser.add_argument('-f', '--file', help="Arquivo com servidores, um por linha")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Conexões SSH simultâneas (padrão: {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--deadline', type=float, default=DEFAULT_DEADLINE, metavar='SEGUNDOS',
+                        help=f"Tempo máximo do lote inteiro (padrão: {DEFAULT_DEADLINE})")
+    parser.add_argument('--ssh', default='ssh', help="Binário ssh (padrão: ssh)")
+    parser.add_argument('--control-dir', default=os.path.expanduser('~/.ssh'),
+                        help="Diretório dos sockets ControlMaster (padrão: ~/.ssh)")
+    parser.add_argument('--json', action='store_true', help="Saída em JSON (uma lista)")
+    parser.add_argument('--zabbix-server', help="Envia os valores ao Zabbix (zabbix_sender -z)")
+    parser.add_argument('--zabbix-config', help="Arquivo do agente para o zabbix_sender (-c)")
+    parser.add_argument('--zabbix-host', default='-',
+                        help="Host do Zabbix com os itens trapper (padrão: '-', o Hostname do -c)")
+    parser.add_argument('--zabbix-sender', default='zabbix_sender', help="Binário zabbix_sender")
+    parser.add_argument('--zabbix-file', metavar='ARQUIVO',
+                        help="Grava a entrada do zabbix_sender em arquivo em vez de enviar ('-' = stdout)")
+    args = parser.parse_args()
+
+    hosts = args.hosts + (read_hosts(args.file) if args.file else [])
+    if not hosts:
+        hosts = SERVERS
+
+    results = asyncio.run(check_all(hosts, args))
+
+    if args.zabbix_file or args.zabbix_server or args.zabbix_config:
+        data = zabbix_lines(results, args.zabbix_host)
+        if args.zabbix_file == '-':
+            sys.stdout.write(data)
+            sys.exit(0)
+        if args.zabbix_file:
+            with open(args.zabbix_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+        elif not zabbix_send(data, args):
+            sys.exit(2)
+
+    if args.json:
+        print(json.dumps(results, indent=1))
+    else:
+        for result in results:
+            print(format_result(result))
+
+    sys.exit(0 if all(r['reachable'] for r in results) else 1)
+
+
+if __name__ == '__main__':
+    main()